@@ -0,0 +1,325 @@
+import os, json, logging, uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+import azure.functions as func
+from shared.parsers.payroll_filename import parse_payroll_filename
+from shared.validators.payroll_rules import check_transfer_consistency
+
+if TYPE_CHECKING:
+    from azure.storage.queue import QueueMessage
+    from shared.repos.table_repository import TableRepository
+    from shared.repos.blob_repository import BlobRepository
+    from shared.repos.queue_repository import QueueRepository
+
+ACCOUNT_NAME = os.getenv("STORAGE_ACCOUNT_NAME")  # Table Storage 用
+# 受信コンテナ・キュー・DI結果コンテナのアカウント（PAYROLL_STORAGE 接続と同じアカウントを指定する）
+INBOX_ACCOUNT_NAME = os.getenv("INBOX_STORAGE_ACCOUNT_NAME")
+TABLE_NAME = os.getenv("TABLE_NAME", "PayrollMonthly")
+QUEUE_NAME = "payroll-ingest"  # fn_blob_ingest の出力バインドと一致させる
+POISON_QUEUE_NAME = "payroll-ingest-poison"
+RESULT_CONTAINER = os.getenv("DI_RESULT_CONTAINER", "payroll-di-results")
+BATCH_MAX_FILES = int(os.getenv("DI_BATCH_MAX_FILES", "100"))
+FILE_LIST_PREFIX = "_batches/"
+VISIBILITY_TIMEOUT_SEC = 900
+MAX_DEQUEUE_COUNT = 5
+DOWNLOAD_WORKERS = int(os.getenv("DI_RESULT_DOWNLOAD_WORKERS", "8"))
+
+# Azure SDK / azure.identity の import はコールドスタートを重くするため初回呼び出しまで遅延する
+_repo = None
+_blobs = None
+_queue = None
+_poison = None
+
+def _get_repo() -> "TableRepository":
+    """Return the shared TableRepository, creating it on first use."""
+    global _repo
+    if _repo is None:
+        from shared.repos.table_repository import TableRepository
+        _repo = TableRepository(ACCOUNT_NAME, TABLE_NAME)
+    return _repo
+
+def _get_blobs() -> "BlobRepository":
+    """Return the shared BlobRepository, creating it on first use."""
+    global _blobs
+    if _blobs is None:
+        from shared.repos.blob_repository import BlobRepository
+        _blobs = BlobRepository(INBOX_ACCOUNT_NAME)
+    return _blobs
+
+def _get_queue() -> "QueueRepository":
+    """Return the shared QueueRepository, creating it on first use."""
+    global _queue
+    if _queue is None:
+        from shared.repos.queue_repository import QueueRepository
+        _queue = QueueRepository(INBOX_ACCOUNT_NAME, QUEUE_NAME)
+    return _queue
+
+def _get_poison_queue() -> "QueueRepository":
+    """Return the QueueRepository for messages that are given up on."""
+    global _poison
+    if _poison is None:
+        from shared.repos.queue_repository import QueueRepository
+        _poison = QueueRepository(INBOX_ACCOUNT_NAME, POISON_QUEUE_NAME)
+    return _poison
+
+def _move_to_poison(message: "QueueMessage") -> None:
+    """Copy a message to the poison queue, then delete it from the ingest queue."""
+    _get_poison_queue().send(message.content)
+    _get_queue().delete(message)
+
+def main(mytimer: func.TimerRequest):
+    """
+    Entry point for the function.
+
+    Drains up to ``DI_BATCH_MAX_FILES`` queued blobs and analyzes them with one
+    ``analyzeBatch`` request per source container, so a single poll loop covers
+    every file that arrived since the previous run. A failing container is
+    logged and skipped; its messages are retried by a later run.
+
+    Args:
+        mytimer (func.TimerRequest): Timer trigger defined in function.json.
+
+    Returns:
+        None: This function returns no value.
+    """
+    try:
+        queue = _get_queue()
+        messages = queue.receive(BATCH_MAX_FILES, VISIBILITY_TIMEOUT_SEC)
+        batches: Dict[str, Dict[str, List["QueueMessage"]]] = {}
+        for m in messages:
+            if m.dequeue_count > MAX_DEQUEUE_COUNT:
+                logging.error("[batch] give up after %d attempts, moved to %s: %s",
+                              m.dequeue_count - 1, POISON_QUEUE_NAME, m.content)
+                _move_to_poison(m)
+                continue
+            try:
+                body = json.loads(m.content)
+                container, blob_path = body["container"], body["blobPath"]
+            except (ValueError, TypeError, KeyError):
+                logging.error("[batch] malformed message, moved to %s: %s", POISON_QUEUE_NAME, m.content)
+                _move_to_poison(m)
+                continue
+            # 同一Blobの重複通知は1件にまとめる
+            batches.setdefault(container, {}).setdefault(blob_path, []).append(m)
+
+        # 1コンテナの失敗で他のコンテナを止めない
+        for container, pending in batches.items():
+            try:
+                _run_batch(container, pending)
+            except Exception:
+                logging.exception("[batch] container=%s failed", container)
+
+    # 例外時処理
+    except Exception:
+        logging.exception("batch ingest failed")
+        raise
+
+def _run_batch(container: str, pending: Dict[str, List["QueueMessage"]]):
+    """
+    Analyze one container's pending blobs and store the results.
+
+    Blobs whose ``Content-MD5`` is found in the DI result cache are not sent to
+    Document Intelligence; the rest go into one ``analyzeBatch`` request, and
+    their result files are downloaded concurrently (``DI_RESULT_DOWNLOAD_WORKERS``).
+    Payslips are upserted per user, and only the messages of stored payslips are
+    deleted; a file or user that fails is logged, and its messages become
+    visible again after ``VISIBILITY_TIMEOUT_SEC`` to be retried by a later run.
+
+    Args:
+        container (str): Source container name.
+        pending (Dict[str, List[QueueMessage]]): Queue messages keyed by blob path.
+    """
+    batch_id = uuid.uuid4().hex
+    paths = list(pending)
+    loaded: List[Tuple[str, Optional[Dict[str, Any]]]] = []
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+        # 解析済みと同一内容のPDF（再アップロード・再通知）は DI に送らない
+        digests: Dict[str, Optional[str]] = {}
+        for path, (digest, row) in zip(paths, pool.map(_lookup_cached_row, [container] * len(paths), paths)):
+            if row is not None:
+                loaded.append((path, row))
+            else:
+                digests[path] = digest
+        if loaded:
+            logging.info("[batch] %s cache hits=%d container=%s", batch_id, len(loaded), container)
+        if digests:
+            try:
+                loaded.extend(_analyze_uncached(pool, batch_id, container, digests))
+            except Exception:
+                # キャッシュから得た行は DI の失敗に巻き込まずに保存する
+                logging.exception("[batch] %s analyzeBatch failed container=%s", batch_id, container)
+
+    rows: Dict[str, List[Dict[str, Any]]] = {}
+    done: Dict[str, List["QueueMessage"]] = {}
+    for path, row in loaded:
+        if row is None:
+            continue
+        rows.setdefault(row["user_id"], []).append(row)
+        done.setdefault(row["user_id"], []).extend(pending.get(path, []))
+
+    # Upsert to Table Strage（PartitionKey = user_id 単位で失敗を切り分ける）
+    queue = _get_queue()
+    for user_id, user_rows in rows.items():
+        try:
+            _get_repo().upsert_payroll_batch(user_rows)
+        except Exception:
+            logging.exception("[batch] %s upsert failed user=%s", batch_id, user_id)
+            continue
+        for m in done[user_id]:
+            queue.delete(m)
+
+def _analyze_uncached(
+    pool: ThreadPoolExecutor,
+    batch_id: str,
+    container: str,
+    digests: Dict[str, Optional[str]],
+) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+    """
+    Run one ``analyzeBatch`` over the given blobs and load the results.
+
+    Args:
+        pool (ThreadPoolExecutor): Executor for the result downloads.
+        batch_id (str): Identifier used for the file list and the result prefix.
+        container (str): Source container name.
+        digests (Dict[str, Optional[str]]): ``Content-MD5`` keyed by blob path;
+            results of blobs with a hash are written to the DI result cache.
+
+    Returns:
+        List[Tuple[str, Optional[Dict[str, Any]]]]: ``(blob path, record)`` per
+        succeeded file; the record is None if its result could not be loaded.
+
+    Raises:
+        Exception: Uploading the file list or the ``analyzeBatch`` call failed.
+    """
+    from shared.di_reader import analyze_batch_from_file_list
+    blobs = _get_blobs()
+    file_list = f"{FILE_LIST_PREFIX}{batch_id}.jsonl"
+    blobs.upload_text(container, file_list, "\n".join(
+        json.dumps({"file": path}, ensure_ascii=False) for path in digests))
+    logging.info("[batch] %s submit files=%d container=%s", batch_id, len(digests), container)
+    try:
+        details = analyze_batch_from_file_list(
+            blobs.container_url(container),
+            file_list,
+            blobs.container_url(RESULT_CONTAINER),
+            f"{batch_id}/",
+        )
+    finally:
+        # 後片付けの失敗で analyzeBatch 側の例外を上書きしない
+        try:
+            blobs.delete_blob(container, file_list)
+        except Exception:
+            logging.warning("[batch] %s file list cleanup failed blob=%s/%s",
+                            batch_id, container, file_list, exc_info=True)
+
+    succeeded = []
+    for d in details:
+        # sourceUrl: https://{account}.blob.core.windows.net/{container}/{blobPath}
+        path = unquote(urlparse(d["sourceUrl"]).path).split("/", 2)[2]
+        if d.get("status") != "succeeded":
+            logging.warning("[batch] %s analyze failed blob=%s/%s error=%s",
+                            batch_id, container, path, d.get("error"))
+            continue
+        succeeded.append((path, d["resultUrl"]))
+
+    # 結果JSONの取得はI/O待ちのため並列化する
+    paths = [path for path, _ in succeeded]
+    loaded = pool.map(_load_row, [container] * len(succeeded), paths,
+                      [url for _, url in succeeded], [digests.get(path) for path in paths])
+    return list(zip(paths, loaded))
+
+def _lookup_cached_row(container: str, path: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """
+    Build a payroll record from the DI result cache without analyzing the blob.
+
+    Args:
+        container (str): Source container name.
+        path (str): Source blob path within ``container``.
+
+    Returns:
+        Tuple[Optional[str], Optional[Dict[str, Any]]]: The blob's ``Content-MD5``
+        (None if unavailable) and the record (None on a cache miss or error,
+        which is logged).
+    """
+    from shared.di_reader import get_cached_fields
+    try:
+        digest = _get_blobs().get_content_md5(container, path)
+    except Exception:
+        logging.warning("[batch] content md5 lookup failed blob=%s/%s", container, path, exc_info=True)
+        return None, None
+    if digest is None:
+        return None, None
+    fields = get_cached_fields(digest)
+    if fields is None:
+        return digest, None
+    try:
+        return digest, _to_row(f"{container}/{path}", fields)
+    except Exception:
+        logging.exception("[batch] cached result handling failed blob=%s/%s", container, path)
+        return digest, None
+
+def _load_row(container: str, path: str, result_url: str, digest: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Download one analyze result, cache it and build its payroll record.
+
+    Args:
+        container (str): Source container name.
+        path (str): Source blob path within ``container``.
+        result_url (str): URL of the analyze result JSON.
+        digest (Optional[str]): ``Content-MD5`` of the source blob; the amounts are
+            written to the DI result cache under it when given.
+
+    Returns:
+        Optional[Dict[str, Any]]: The record, or None if the result could not be
+        downloaded, decoded or mapped (the error is logged).
+    """
+    from shared.di_reader import extract_pay_slip_fields, put_cached_fields
+    try:
+        fields = extract_pay_slip_fields(_get_blobs().download_bytes(result_url))
+        if digest is not None:
+            put_cached_fields(digest, fields)
+        return _to_row(f"{container}/{path}", fields)
+    except Exception:
+        logging.exception("[batch] result handling failed blob=%s/%s", container, path)
+        return None
+
+def _to_row(blob_path: str, fields: Dict[str, int]) -> Dict[str, Any]:
+    """
+    Validate one analyzed payslip and build its payroll record.
+
+    Args:
+        blob_path (str): Source blob path as ``{container}/{blobPath}``.
+        fields (Dict[str, int]): Amounts extracted by Document Intelligence.
+
+    Returns:
+        Dict[str, Any]: Keyword arguments for ``TableRepository.upsert_payroll``.
+    """
+    filename = os.path.basename(blob_path)
+    user_id, year, month, pay_type = parse_payroll_filename(filename)
+    logging.info("[ingest] %s -> user=%s %04d-%02d type=%s", blob_path, user_id, year, month, pay_type)
+
+    # Field elements validation
+    ok, info = check_transfer_consistency(fields)
+    if not ok:
+        if "error" in info:
+            logging.warning("[consistency] invalid number format user=%s %04d-%02d type=%s blob=%s",
+                            user_id, year, month, pay_type, blob_path)
+        else:
+            logging.warning("[consistency] mismatch user=%s %04d-%02d type=%s expected=%s transfer=%s diff=%s blob=%s",
+                            user_id, year, month, pay_type,
+                            str(info["expected"]), str(info["transfer"]), str(info["diff"]), blob_path)
+
+    return dict(
+        user_id=user_id,
+        year=year,
+        month=month,
+        pay_type=pay_type,
+        blob_path=blob_path,
+        filename=filename,
+        total_gross=fields.get("total_gross", 0),
+        total_deduction=fields.get("total_deduction", 0),
+        other_payment=fields.get("other_payment", 0),
+        transfer_amount=fields.get("transfer_amount", 0),
+        status="parsed"
+    )
@@ -1,61 +1,42 @@
-import os, logging
+import os, json, logging
 import azure.functions as func
-from shared.repos.table_repository import TableRepository
-from shared.parsers.payroll_filename import parse_payroll_filename
-from shared.di_reader import analyze_pay_slip_from_bytes
-from shared.validators.payroll_rules import check_transfer_consistency
 
-ACCOUNT_NAME = os.getenv("STORAGE_ACCOUNT_NAME")
-TABLE_NAME = os.getenv("TABLE_NAME", "PayrollMonthly")
+INBOX_CONTAINER = os.getenv("PAYROLL_INBOX_CONTAINER", "payroll-inbox")
+BLOB_CREATED = "Microsoft.Storage.BlobCreated"
 
-# Create the TableRepository instance
-_repo = TableRepository(ACCOUNT_NAME, TABLE_NAME)
-
-def main(myblob: func.InputStream):
+def main(event: func.EventGridEvent, msg: func.Out[str]):
     """
     Entry point for the function.
-    
+
+    Receives a ``BlobCreated`` event for the payroll inbox and enqueues the blob
+    for the next ``analyzeBatch`` run of ``fn_batch_analyze``. Other event types
+    and containers other than ``PAYROLL_INBOX_CONTAINER`` are ignored.
+
     Args:
-        myblob (func.InputStream): Input blob stream defined in function.json.
-    
+        event (func.EventGridEvent): Blob event defined in function.json.
+        msg (func.Out[str]): Queue output binding receiving ``{container, blobPath}``.
+
     Returns:
         None: This function returns no value.
     """
     try:
-        blob_path = myblob.name
-        filename = os.path.basename(blob_path)
-        user_id, year, month, pay_type = parse_payroll_filename(filename)
-        logging.info(f"[ingest] %s -> user=%s %04d-%02d type=%s", blob_path, user_id, year, month, pay_type)
-
-        # PDFバイトをそのままDIへ送信して4値を抽出
-        pdf_bytes = myblob.read()
-        fields = analyze_pay_slip_from_bytes(pdf_bytes)
-
-        # Field elements validation
-        ok, info = check_transfer_consistency(fields)
-        if not ok:
-            if "error" in info:
-                logging.warning("[consistency] invalid number format user=%s %04d-%02d type=%s blob=%s",
-                                user_id, year, month, pay_type, blob_path)
-            else:
-                logging.warning("[consistency] mismatch user=%s %04d-%02d type=%s expected=%s transfer=%s diff=%s blob=%s",
-                                user_id, year, month, pay_type,
-                                str(info["expected"]), str(info["transfer"]), str(info["diff"]), blob_path)
-
-        # Upsert to Table Strage
-        _repo.upsert_payroll(
-            user_id=user_id,
-            year=year,
-            month=month,
-            pay_type=pay_type,
-            blob_path=blob_path,
-            filename=filename,
-            total_gross=fields.get("total_gross", 0),
-            total_deduction=fields.get("total_deduction", 0),
-            other_payment=fields.get("other_payment", 0),
-            transfer_amount=fields.get("transfer_amount", 0),
-            status="parsed"
-        )
+        if event.event_type != BLOB_CREATED:
+            logging.info("[ingest] skip event=%s %s", event.event_type, event.subject)
+            return
+
+        # subject: /blobServices/default/containers/{container}/blobs/{blobPath}
+        _, _, rest = event.subject.partition("/containers/")
+        container, _, blob_path = rest.partition("/blobs/")
+        if container != INBOX_CONTAINER:
+            logging.info("[ingest] skip container=%s", container)
+            return
+        # バッチ用ファイルリスト等、PDF以外は対象外
+        if not blob_path.lower().endswith(".pdf"):
+            logging.info("[ingest] skip %s", event.subject)
+            return
+
+        logging.info("[ingest] queued %s/%s", container, blob_path)
+        msg.set(json.dumps({"container": container, "blobPath": blob_path}, ensure_ascii=False))
 
     # 例外時処理
     except Exception:
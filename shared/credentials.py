@@ -0,0 +1,23 @@
+import os
+from functools import cache
+from azure.core.credentials import TokenCredential
+from azure.identity import DefaultAzureCredential, ManagedIdentityCredential
+
+@cache
+def get_credential() -> TokenCredential:
+    """
+    Return the process-wide Azure credential for Storage access.
+
+    On Azure Functions (``WEBSITE_INSTANCE_ID`` is set) only managed identity can
+    succeed, so ManagedIdentityCredential is used directly instead of probing the
+    whole DefaultAzureCredential chain. ``AZURE_CLIENT_ID`` selects a
+    user-assigned identity; leave it unset for the system-assigned one.
+    Elsewhere (local development) DefaultAzureCredential is used.
+
+    Returns:
+        TokenCredential: A credential shared by all repositories, so access
+        tokens are cached once per worker process.
+    """
+    if os.getenv("WEBSITE_INSTANCE_ID"):
+        return ManagedIdentityCredential(client_id=os.getenv("AZURE_CLIENT_ID"))
+    return DefaultAzureCredential()
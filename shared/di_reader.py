@@ -1,11 +1,74 @@
 import os
+import hashlib
+import logging
 import time
+import msgspec
 import requests
-from typing import Dict, Any
+from requests.adapters import HTTPAdapter
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple
+from urllib3.util.retry import Retry
+
+if TYPE_CHECKING:
+    from shared.repos.di_cache_repository import DiCacheRepository
 
 ENDPOINT = os.getenv("DI_ENDPOINT", "").rstrip("/")
 KEY      = os.getenv("DI_KEY", "")
 MODEL_ID = os.getenv("DI_MODEL_ID", "")
+API_VERSION = "2024-11-30"
+POLL_INTERVAL_SEC = int(os.getenv("DI_POLL_INTERVAL_SEC", "5"))
+# 全角数字/マイナス→半角、桁区切り(半角・全角カンマ)は削除
+_FULLWIDTH_TRANS = str.maketrans("０１２３４５６７８９－", "0123456789-", ",，")
+CACHE_ACCOUNT_NAME = os.getenv("STORAGE_ACCOUNT_NAME", "")
+CACHE_TABLE = os.getenv("DI_CACHE_TABLE", "PayrollDiCache")
+
+# 接続(TCP+TLS)を呼び出し間で再利用する。429/5xx は Retry-After を尊重して再試行
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=5,
+        backoff_factor=1.0,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET", "POST"],
+        raise_on_status=False,
+    ),
+))
+_session.headers["Ocp-Apim-Subscription-Key"] = KEY
+
+_cache: Optional["DiCacheRepository"] = None
+
+# DI レスポンスのうち参照する部分だけを型定義する（それ以外はデコード時に読み飛ばされる）
+class _Currency(msgspec.Struct):
+    amount: Optional[float] = None
+
+class _Field(msgspec.Struct):
+    valueNumber: Optional[float] = None
+    valueCurrency: Optional[_Currency] = None
+    content: Optional[str] = None
+
+class _PayrollFields(msgspec.Struct):
+    total_gross: Optional[_Field] = None
+    total_deduction: Optional[_Field] = None
+    other_payment: Optional[_Field] = None
+    transfer_amount: Optional[_Field] = None
+
+class _Document(msgspec.Struct):
+    fields: _PayrollFields = msgspec.field(default_factory=_PayrollFields)
+
+class _AnalyzeResult(msgspec.Struct):
+    documents: List[_Document] = []
+
+class _ResultBody(msgspec.Struct):
+    # 操作レスポンス（analyzeResult 入り）と analyzeResult 単体の両方を受ける
+    analyzeResult: Optional[_AnalyzeResult] = None
+    documents: List[_Document] = []
+
+class _Status(msgspec.Struct):
+    status: Optional[str] = None
+
+_status_decoder = msgspec.json.Decoder(_Status)
+_result_decoder = msgspec.json.Decoder(_ResultBody)
 
 class DIConfigError(RuntimeError):
     """
@@ -16,7 +79,7 @@ class DIConfigError(RuntimeError):
     """
     pass
 
-def _check_env():
+def _check_env() -> None:
     """
     Validate required Document Intelligence environment variables.
 
@@ -28,39 +91,136 @@ def _check_env():
     if not ENDPOINT or not KEY or not MODEL_ID:
         raise DIConfigError("DI_ENDPOINT/DI_KEY/DI_MODEL_ID が未設定")
 
-def _poll_operation(op_url: str, headers: Dict[str, str]) -> Dict[str, Any]:
+def _get_cache() -> Optional["DiCacheRepository"]:
     """
-    Poll a Document Intelligence analyze operation until completion.
+    Return the shared analyze result cache, creating it on first use.
+
+    Returns:
+        Optional[DiCacheRepository]: The cache, or ``None`` when
+        ``STORAGE_ACCOUNT_NAME`` is not set.
+    """
+    global _cache
+    if _cache is None and CACHE_ACCOUNT_NAME:
+        from shared.repos.di_cache_repository import DiCacheRepository
+        _cache = DiCacheRepository(CACHE_ACCOUNT_NAME, CACHE_TABLE)
+    return _cache
+
+def get_cached_fields(digest: str) -> Optional[Dict[str, int]]:
+    """
+    Look up the cached amounts of a PDF analyzed with ``MODEL_ID``.
 
-    Sends GET requests to the given operation URL until the job succeeds,
-    fails, or is canceled. Honors the ``Retry-After`` response header when
-    present.
+    The cache is best-effort: a lookup error is logged and treated as a miss.
+
+    Args:
+        digest (str): Lowercase hex MD5 of the PDF (the blob's ``Content-MD5``).
+
+    Returns:
+        Optional[Dict[str, int]]: The cached amounts, or ``None`` on a miss, on
+        error, or when the cache is not configured.
+    """
+    cache = _get_cache()
+    if cache is None:
+        return None
+    try:
+        return cache.get(MODEL_ID, digest)
+    except Exception:
+        logging.warning("[di-cache] get failed digest=%s", digest, exc_info=True)
+        return None
+
+def put_cached_fields(digest: str, fields: Dict[str, int]) -> None:
+    """
+    Store the amounts of a PDF analyzed with ``MODEL_ID``.
+
+    The cache is best-effort: a write error is logged and ignored.
+
+    Args:
+        digest (str): Lowercase hex MD5 of the PDF (the blob's ``Content-MD5``).
+        fields (Dict[str, int]): Amounts returned by the analysis.
+    """
+    cache = _get_cache()
+    if cache is None:
+        return
+    try:
+        cache.put(MODEL_ID, digest, fields)
+    except Exception:
+        logging.warning("[di-cache] put failed digest=%s", digest, exc_info=True)
+
+def _begin_operation(action: str, timeout: int, **kwargs: Any) -> str:
+    """
+    Start a long-running Document Intelligence operation on ``MODEL_ID``.
+
+    Args:
+        action (str): Model action, ``analyze`` or ``analyzeBatch``.
+        timeout (int): Request timeout in seconds.
+        **kwargs: Body arguments for ``requests.Session.post`` (``data``/``json``, ``headers``).
+
+    Returns:
+        str: The operation URL from the ``Operation-Location`` header.
+
+    Raises:
+        DIConfigError: Missing endpoint, key, or model ID configuration.
+        requests.HTTPError: Non-2xx response after retries are exhausted.
+        KeyError: Missing ``Operation-Location`` header in the response.
+    """
+    _check_env()
+    url = f"{ENDPOINT}/documentintelligence/documentModels/{MODEL_ID}:{action}"
+    resp = _session.post(url, params={"api-version": API_VERSION}, timeout=timeout, **kwargs)
+    resp.raise_for_status()
+    return resp.headers["Operation-Location"]
+
+def _wait_operation(op_url: str) -> Tuple[Optional[str], bytes]:
+    """
+    Poll a Document Intelligence operation until it reaches a terminal state.
+
+    Sends GET requests to the given operation URL until the job leaves the
+    ``notStarted``/``running`` states. Waits ``max(POLL_INTERVAL_SEC, Retry-After)``
+    seconds between requests, since the service keeps answering
+    ``Retry-After: 1`` while the analysis is still running.
+
+    Only ``status`` is decoded here; the body is returned undecoded so callers
+    can decode just the parts they need.
 
     Args:
         op_url (str): Operation URL returned in the ``Operation-Location`` header.
-        headers (dict): HTTP headers.
 
     Returns:
-        dict: The ``analyzeResult`` object on success.
+        tuple[str | None, bytes]: (status, raw JSON body) of the terminal response.
 
     Raises:
         requests.HTTPError: If the polling request returns a 4xx/5xx status.
-        RuntimeError: If the operation status is ``failed`` or ``canceled``.
-        ValueError: If the response body is not a valid JSON object.
+        msgspec.DecodeError: If the response body is not valid JSON.
     """
     while True:
-        r = requests.get(op_url, headers=headers, timeout=30)
+        r = _session.get(op_url, timeout=30)
         r.raise_for_status()
-        body = r.json()
-        st = body.get("status")
-        if st in ("succeeded", "completed"):
-            return body["analyzeResult"]
-        if st in ("failed", "canceled"):
-            raise RuntimeError(f"Document Intelligence analyze failed: {body}")
+        status = _status_decoder.decode(r.content).status
+        if status not in ("notStarted", "running"):
+            return status, r.content
         retry = r.headers.get("Retry-After")
-        time.sleep(int(retry) if retry and retry.isdigit() else 2)
+        # 未完了でも Retry-After: 1 が返るため、下限間隔を設けて無駄なポーリングを抑える
+        time.sleep(max(POLL_INTERVAL_SEC, int(retry) if retry and retry.isdigit() else 0))
 
-def _num_from_field(f: Dict[str, Any]) -> int:
+def _poll_operation(op_url: str) -> bytes:
+    """
+    Poll a Document Intelligence analyze operation until completion.
+
+    Args:
+        op_url (str): Operation URL returned in the ``Operation-Location`` header.
+
+    Returns:
+        bytes: The raw JSON body (containing ``analyzeResult``) on success.
+
+    Raises:
+        requests.HTTPError: If the polling request returns a 4xx/5xx status.
+        RuntimeError: If the operation status is ``failed`` or ``canceled``.
+        msgspec.DecodeError: If the response body is not valid JSON.
+    """
+    status, content = _wait_operation(op_url)
+    if status in ("succeeded", "completed"):
+        return content
+    raise RuntimeError(f"Document Intelligence analyze failed: {msgspec.json.decode(content)}")
+
+def _num_from_field(f: Optional[_Field]) -> int:
     """
     Extract an integer amount from a Document Intelligence field object.
 
@@ -72,40 +232,80 @@ def _num_from_field(f: Dict[str, Any]) -> int:
     If extraction fails, returns ``0``.
 
     Args:
-        f (Dict[str, Any]): Field object from the model output.
+        f (Optional[_Field]): Decoded field from the model output, or ``None``.
 
     Returns:
         int: Parsed whole amount (e.g., JPY) as an integer; ``0`` on failure.
     """
-    if not f:
+    if f is None:
         return 0
-    if isinstance(f.get("valueNumber"), (int, float)):
-        return int(f["valueNumber"])
-    vc = f.get("valueCurrency")
-    if isinstance(vc, dict) and isinstance(vc.get("amount"), (int, float)):
-        return int(vc["amount"])
-    content = f.get("content")
-    if isinstance(content, str):
-        s = content.strip().replace(",", "")
-        # 全角→半角
-        s = s.translate(str.maketrans("０１２３４５６７８９－", "0123456789-"))
+    if f.valueNumber is not None:
+        return int(f.valueNumber)
+    if f.valueCurrency is not None and f.valueCurrency.amount is not None:
+        return int(f.valueCurrency.amount)
+    if f.content is not None:
+        s = f.content.strip().translate(_FULLWIDTH_TRANS)
         try:
             return int(float(s))
         except Exception:
             return 0
     return 0
 
-def analyze_pay_slip_from_bytes(pdf_bytes: bytes, content_type: str = "application/pdf") -> Dict[str, int]:
+def extract_pay_slip_fields(content: bytes) -> Dict[str, int]:
+    """
+    Extract the payroll amounts from a Document Intelligence result JSON.
+
+    Accepts both an analyze operation body (``analyzeResult.documents``) and a
+    bare ``analyzeResult`` (``documents``). The body is decoded into typed
+    structs that declare only the four payroll fields, so pages, words and
+    other fields are skipped without building Python objects. Only the first
+    document is read, matching one payslip per PDF.
+
+    Args:
+        content (bytes): Raw analyze operation body or ``analyzeResult`` JSON.
+
+    Returns:
+        Dict[str, int]: A mapping with keys:
+            - ``total_gross`` (int)
+            - ``total_deduction`` (int)
+            - ``other_payment`` (int)
+            - ``transfer_amount`` (int)
+
+    Raises:
+        msgspec.DecodeError: The body is not valid JSON or has unexpected types.
+    """
+    body = _result_decoder.decode(content)
+    documents = body.analyzeResult.documents if body.analyzeResult is not None else body.documents
+    # 学習済みカスタムの fields から抽出
+    fields = documents[0].fields if documents else _PayrollFields()
+    return {
+        "total_gross":     _num_from_field(fields.total_gross),
+        "total_deduction": _num_from_field(fields.total_deduction),
+        "other_payment":   _num_from_field(fields.other_payment),
+        "transfer_amount": _num_from_field(fields.transfer_amount),
+    }
+
+def analyze_pay_slip_from_bytes(
+    pdf_bytes: bytes,
+    content_type: str = "application/pdf",
+    use_cache: bool = True,
+) -> Dict[str, int]:
     """
     Analyze payroll fields from in-memory PDF bytes using a custom DI model.
 
-    Submits the raw PDF bytes to the Document Intelligence Analyze endpoint and
+    Submits the PDF bytes to the Document Intelligence Analyze endpoint and
     polls the operation until completion. The result is normalized to a dict of
     whole-number amounts.
 
+    Results are cached in the ``DI_CACHE_TABLE`` table keyed by the model ID and
+    the MD5 of ``pdf_bytes``, the same key the batch path derives from the blob's
+    ``Content-MD5``, so re-delivered PDFs skip the analysis.
+
     Args:
         pdf_bytes (bytes): Raw PDF payload to analyze.
         content_type (str): MIME type of the payload. Defaults to ``application/pdf``.
+        use_cache (bool): Look up the cache first. ``False`` forces a fresh
+            analysis, whose result still refreshes the cache.
 
     Returns:
         Dict[str, int]: A mapping with keys:
@@ -122,26 +322,18 @@ def analyze_pay_slip_from_bytes(pdf_bytes: bytes, content_type: str = "applicati
         requests.RequestException: Network or timeout error.
     """
     _check_env()
-    url = f"{ENDPOINT}/documentintelligence/documentModels/{MODEL_ID}:analyze"
-    params = {"api-version": "2024-11-30"}
-    headers = {
-        "Ocp-Apim-Subscription-Key": KEY,
-        "Content-Type": content_type,
-    }
-    # 解析開始（バイト送信）
-    resp = requests.post(url, params=params, headers=headers, data=pdf_bytes, timeout=60)
-    resp.raise_for_status()
-    op_url = resp.headers["Operation-Location"]
-    result = _poll_operation(op_url, {"Ocp-Apim-Subscription-Key": KEY})
+    # Blob の Content-MD5 と同じ値（改ざん検知ではなく同一性の判定に使う）
+    digest = hashlib.md5(pdf_bytes, usedforsecurity=False).hexdigest()
+    if use_cache:
+        cached = get_cached_fields(digest)
+        if cached is not None:
+            return cached
 
-    # 学習済みカスタムの fields から抽出
-    fields = (result.get("documents") or [{}])[0].get("fields") or {}
-    return {
-        "total_gross":     _num_from_field(fields.get("total_gross")),
-        "total_deduction": _num_from_field(fields.get("total_deduction")),
-        "other_payment":   _num_from_field(fields.get("other_payment")),
-        "transfer_amount": _num_from_field(fields.get("transfer_amount")),
-    }
+    # 解析開始（バイト送信）
+    op_url = _begin_operation("analyze", 60, headers={"Content-Type": content_type}, data=pdf_bytes)
+    fields = extract_pay_slip_fields(_poll_operation(op_url))
+    put_cached_fields(digest, fields)
+    return fields
 
 def analyze_pay_slip_from_url(sas_url: str) -> Dict[str, int]:
     """
@@ -167,19 +359,52 @@ def analyze_pay_slip_from_url(sas_url: str) -> Dict[str, int]:
         RuntimeError: Analyze operation failed or was canceled.
         requests.RequestException: Network or timeout error.
     """
-    _check_env()
-    url = f"{ENDPOINT}/documentintelligence/documentModels/{MODEL_ID}:analyze"
-    params = {"api-version": "2024-11-30"}
-    headers = {"Ocp-Apim-Subscription-Key": KEY, "Content-Type": "application/json"}
-    resp = requests.post(url, params=params, headers=headers, json={"urlSource": sas_url}, timeout=30)
-    resp.raise_for_status()
-    op_url = resp.headers["Operation-Location"]
-    result = _poll_operation(op_url, {"Ocp-Apim-Subscription-Key": KEY})
+    op_url = _begin_operation("analyze", 30, json={"urlSource": sas_url})
+    return extract_pay_slip_fields(_poll_operation(op_url))
 
-    fields = (result.get("documents") or [{}])[0].get("fields") or {}
-    return {
-        "total_gross":     _num_from_field(fields.get("total_gross")),
-        "total_deduction": _num_from_field(fields.get("total_deduction")),
-        "other_payment":   _num_from_field(fields.get("other_payment")),
-        "transfer_amount": _num_from_field(fields.get("transfer_amount")),
+def analyze_batch_from_file_list(
+    container_url: str,
+    file_list: str,
+    result_container_url: str,
+    result_prefix: str,
+) -> List[Dict[str, Any]]:
+    """
+    Analyze many blobs with one Document Intelligence ``analyzeBatch`` call.
+
+    Submits the blobs listed in ``file_list`` (a JSONL blob of
+    ``{"file": "<blob path>"}`` lines inside ``container_url``) and polls the
+    single batch operation until it finishes. The service writes one analyze
+    result JSON per source file under ``result_prefix`` in the result container.
+
+    Args:
+        container_url (str): URL of the container holding the PDFs and the file list.
+        file_list (str): Blob path of the JSONL file list, relative to ``container_url``.
+        result_container_url (str): URL of the container that receives the results.
+        result_prefix (str): Blob prefix for this batch's result files.
+
+    Returns:
+        List[Dict[str, Any]]: One entry per source file with ``sourceUrl``,
+        ``resultUrl`` and ``status`` (``succeeded`` or ``failed``).
+
+    Raises:
+        DIConfigError: Missing endpoint, key, or model ID configuration.
+        requests.HTTPError: Non-2xx response from the service.
+        KeyError: Missing ``Operation-Location`` header in the initial response.
+        RuntimeError: The batch was canceled or returned no per-file details.
+        requests.RequestException: Network or timeout error.
+    """
+    payload = {
+        "azureBlobFileListSource": {"containerUrl": container_url, "fileList": file_list},
+        "resultContainerUrl": result_container_url,
+        "resultPrefix": result_prefix,
+        "overwriteExisting": True,
     }
+    op_url = _begin_operation("analyzeBatch", 30, json=payload)
+    status, content = _wait_operation(op_url)
+    body = msgspec.json.decode(content)
+
+    # 一部ファイルの失敗でも status=failed になるため、ファイル単位の結果で判定する
+    details = (body.get("result") or {}).get("details")
+    if status == "canceled" or details is None:
+        raise RuntimeError(f"Document Intelligence analyzeBatch failed: {body}")
+    return details
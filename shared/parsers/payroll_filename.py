@@ -1,12 +1,10 @@
 import os
-import re
 from datetime import datetime, timezone
 
-_PATTERN = re.compile(
-    r'^(?P<date>\d{8})_(?P<title>支給明細書|賞与明細書)_(?P<uid>\d+)\.pdf$'
-)
+# 形式: YYYYMMDD_<title>_<uid>.pdf
+_TITLES: dict[str, str] = {"支給明細書": "salary", "賞与明細書": "bonus"}
 
-def parse_payroll_filename(name: str):
+def parse_payroll_filename(name: str) -> tuple[str, int, int, str]:
     """
     Parse a payroll filename and extracted the user ID, year, month, and pay type.
     
@@ -20,13 +18,15 @@ def parse_payroll_filename(name: str):
         ValueError: If the filename format is invalid.
     """
     base = os.path.basename(name)
-    m = _PATTERN.match(base)
-    if m:
-        d = m.group('date')
-        year = int(d[0:4])
-        month = int(d[4:6])
-        pay_type = 'bonus' if '賞与' in m.group('title') else 'salary'
-        user_id = m.group('uid')  # 先頭ゼロ維持
-        return user_id, year, month, pay_type
+    if base.endswith(".pdf"):
+        parts = base[:-4].split("_")
+        # isdecimal は正規表現の \d と同じ文字集合
+        if (len(parts) == 3 and len(parts[0]) == 8 and parts[0].isdecimal()
+                and parts[1] in _TITLES and parts[2].isdecimal()):
+            d = parts[0]
+            year = int(d[0:4])
+            month = int(d[4:6])
+            user_id = parts[2]  # 先頭ゼロ維持
+            return user_id, year, month, _TITLES[parts[1]]
     now = datetime.now(timezone.utc)
-    return "unknown", now.year, now.month, "salary"
\ No newline at end of file
+    return "unknown", now.year, now.month, "salary"
@@ -0,0 +1,111 @@
+from functools import cached_property
+from typing import Optional
+from urllib.parse import unquote, urlparse
+from azure.storage.blob import BlobServiceClient
+from shared.credentials import get_credential
+
+class BlobRepository:
+    def __init__(self, account_name: str):
+        """
+        Initialize the repository for Azure Blob Storage.
+
+        Args:
+            account_name (str): Storage account name.
+
+        Raises:
+            ValueError: If `account_name` is empty.
+
+        Notes:
+            - Endpoint format: ``https://{account_name}.blob.core.windows.net``.
+            - The credential and client are created on first use.
+        """
+        if not account_name:
+            raise ValueError("account_name is empty")
+        self._endpoint = f"https://{account_name}.blob.core.windows.net"
+
+    @cached_property
+    def _service(self):
+        """Blob service client, created on first access."""
+        return BlobServiceClient(account_url=self._endpoint, credential=get_credential())
+
+    def container_url(self, container: str) -> str:
+        """
+        Build the URL of a container in this account.
+
+        Args:
+            container (str): Container name.
+
+        Returns:
+            str: Container URL without SAS (access is granted by managed identity).
+        """
+        return f"{self._endpoint}/{container}"
+
+    def upload_text(self, container: str, name: str, text: str) -> None:
+        """
+        Write a UTF-8 text blob, overwriting any existing blob.
+
+        Args:
+            container (str): Container name.
+            name (str): Blob path inside the container.
+            text (str): Blob content.
+
+        Raises:
+            azure.core.exceptions.HttpResponseError: Service returned 4xx/5xx on upload.
+        """
+        self._service.get_blob_client(container, name).upload_blob(text.encode("utf-8"), overwrite=True)
+
+    def delete_blob(self, container: str, name: str) -> None:
+        """
+        Delete a blob.
+
+        Args:
+            container (str): Container name.
+            name (str): Blob path inside the container.
+
+        Raises:
+            azure.core.exceptions.ResourceNotFoundError: The blob does not exist.
+        """
+        self._service.get_blob_client(container, name).delete_blob()
+
+    def get_content_md5(self, container: str, name: str) -> Optional[str]:
+        """
+        Return the ``Content-MD5`` of a blob as lowercase hex.
+
+        Args:
+            container (str): Container name.
+            name (str): Blob path inside the container.
+
+        Returns:
+            Optional[str]: The hash, or ``None`` when the blob has none (the service
+            sets it for single-request uploads only).
+
+        Raises:
+            azure.core.exceptions.ResourceNotFoundError: The blob does not exist.
+        """
+        props = self._service.get_blob_client(container, name).get_blob_properties()
+        md5 = props.content_settings.content_md5
+        return bytes(md5).hex() if md5 else None
+
+    def download_bytes(self, url: str) -> bytes:
+        """
+        Download a blob of this account by its full URL.
+
+        The URL is split into container and blob name so the download goes through
+        the shared service client and reuses its connection pool.
+
+        Args:
+            url (str): Blob URL (e.g. a ``resultUrl`` reported by Document Intelligence).
+
+        Returns:
+            bytes: The blob content.
+
+        Raises:
+            ValueError: The URL does not point into this account.
+            azure.core.exceptions.ResourceNotFoundError: The blob does not exist.
+        """
+        parsed = urlparse(url)
+        if f"{parsed.scheme}://{parsed.netloc}" != self._endpoint:
+            raise ValueError(f"blob url is outside {self._endpoint}: {url}")
+        # path: /{container}/{blobPath}（blobPath は URL エンコード済み）
+        container, _, name = unquote(parsed.path).lstrip("/").partition("/")
+        return self._service.get_blob_client(container, name).download_blob().readall()
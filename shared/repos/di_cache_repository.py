@@ -0,0 +1,80 @@
+from functools import cached_property
+from typing import Any, Dict, Optional
+from azure.core.exceptions import ResourceNotFoundError
+from azure.data.tables import TableServiceClient
+from shared.credentials import get_credential
+
+# Dict キー -> Table プロパティ名
+_PROPS = {
+    "total_gross": "totalGross",
+    "total_deduction": "totalDeduction",
+    "other_payment": "otherPayment",
+    "transfer_amount": "transferAmount",
+}
+
+class DiCacheRepository:
+    def __init__(self, account_name: str, table_name: str):
+        """
+        Initialize the Document Intelligence result cache on Azure Table Storage.
+
+        Entities are keyed by PartitionKey = model ID and RowKey = hex MD5 of the
+        analyzed PDF, so retraining under a new model ID starts a fresh cache.
+
+        Args:
+            account_name (str): Storage account name.
+            table_name (str): Table name.
+
+        Raises:
+            ValueError: If `account_name` or `table_name` is empty.
+        """
+        if not account_name:
+            raise ValueError("STORAGE_ACCOUNT_NAME is empty")
+        if not table_name:
+            raise ValueError("DI_CACHE_TABLE is empty")
+        self._endpoint = f"https://{account_name}.table.core.windows.net"
+        self._table_name = table_name
+
+    @cached_property
+    def _table(self):
+        """
+        Table client, created on first access.
+
+        Uses the shared credential (managed identity on Azure) and
+        creates the table if it does not exist.
+
+        Raises:
+            azure.core.exceptions.HttpResponseError: Service returned 4xx/5xx during
+                table creation or access.
+        """
+        service = TableServiceClient(endpoint=self._endpoint, credential=get_credential())
+        return service.create_table_if_not_exists(self._table_name)
+
+    def get(self, model_id: str, digest: str) -> Optional[Dict[str, int]]:
+        """
+        Look up cached amounts for a PDF.
+
+        Args:
+            model_id (str): Document Intelligence model ID.
+            digest (str): Hex MD5 of the PDF bytes.
+
+        Returns:
+            Optional[Dict[str, int]]: The cached amounts, or ``None`` on a miss.
+        """
+        try:
+            entity = self._table.get_entity(model_id, digest, select=list(_PROPS.values()))
+        except ResourceNotFoundError:
+            return None
+        return {k: int(entity.get(p, 0)) for k, p in _PROPS.items()}
+
+    def put(self, model_id: str, digest: str, fields: Dict[str, int]) -> None:
+        """
+        Store the amounts extracted for a PDF.
+
+        Args:
+            model_id (str): Document Intelligence model ID.
+            digest (str): Hex MD5 of the PDF bytes.
+            fields (Dict[str, int]): Amounts returned by the analysis.
+        """
+        entity: Dict[str, Any] = {"PartitionKey": model_id, "RowKey": digest}
+        entity.update({p: int(fields.get(k, 0)) for k, p in _PROPS.items()})
+        self._table.upsert_entity(entity, mode="replace")
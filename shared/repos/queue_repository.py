@@ -0,0 +1,98 @@
+import logging
+from functools import cached_property
+from typing import List
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+from azure.storage.queue import (
+    QueueClient, QueueMessage, TextBase64DecodePolicy, TextBase64EncodePolicy,
+)
+from shared.credentials import get_credential
+
+class QueueRepository:
+    def __init__(self, account_name: str, queue_name: str):
+        """
+        Initialize the repository for an Azure Storage queue.
+
+        Messages are Base64-encoded, the default of the Functions queue output
+        binding that writes them.
+
+        Args:
+            account_name (str): Storage account name.
+            queue_name (str): Queue name.
+
+        Raises:
+            ValueError: If `account_name` or `queue_name` is empty.
+
+        Notes:
+            - Endpoint format: ``https://{account_name}.queue.core.windows.net``.
+            - The queue client is prepared on first use (see ``_queue``).
+        """
+        if not account_name:
+            raise ValueError("account_name is empty")
+        if not queue_name:
+            raise ValueError("queue_name is empty")
+        self._endpoint = f"https://{account_name}.queue.core.windows.net"
+        self._queue_name = queue_name
+
+    @cached_property
+    def _queue(self) -> QueueClient:
+        """
+        Queue client, created on first access.
+
+        Uses the shared credential (managed identity on Azure). The queue is not
+        created here: a reader must not create it on a misconfigured account and
+        hide the mistake; :meth:`send` creates it on demand.
+        """
+        return QueueClient(
+            account_url=self._endpoint,
+            queue_name=self._queue_name,
+            credential=get_credential(),
+            message_encode_policy=TextBase64EncodePolicy(),
+            message_decode_policy=TextBase64DecodePolicy(),
+        )
+
+    def receive(self, max_messages: int, visibility_timeout: int) -> List[QueueMessage]:
+        """
+        Receive up to ``max_messages`` messages and hide them from other readers.
+
+        Args:
+            max_messages (int): Upper bound on the number of messages returned.
+            visibility_timeout (int): Seconds before an undeleted message reappears.
+
+        Returns:
+            List[QueueMessage]: Received messages; empty when the queue is empty
+            or does not exist yet (a warning is logged in that case).
+        """
+        try:
+            return list(self._queue.receive_messages(
+                messages_per_page=32,
+                max_messages=max_messages,
+                visibility_timeout=visibility_timeout,
+            ))
+        except ResourceNotFoundError:
+            logging.warning("[queue] %s/%s not found", self._endpoint, self._queue_name)
+            return []
+
+    def delete(self, message: QueueMessage) -> None:
+        """
+        Delete a processed message.
+
+        Args:
+            message (QueueMessage): A message returned by :meth:`receive`.
+        """
+        self._queue.delete_message(message)
+
+    def send(self, content: str) -> None:
+        """
+        Send a message, creating the queue if it does not exist.
+
+        Args:
+            content (str): Message text.
+        """
+        try:
+            self._queue.send_message(content)
+        except ResourceNotFoundError:
+            try:
+                self._queue.create_queue()
+            except ResourceExistsError:
+                pass
+            self._queue.send_message(content)
@@ -1,14 +1,34 @@
-from datetime import datetime, timezone
-from azure.identity import DefaultAzureCredential
-from azure.data.tables import TableServiceClient
+import itertools
+import time
+from functools import cached_property
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List
+from azure.data.tables import TableServiceClient, TransactionOperation
+from shared.credentials import get_credential
+
+# Entity Group Transaction の上限（同一 PartitionKey 内で100操作）
+_MAX_TRANSACTION_SIZE = 100
+# 再取込時に変更有無を判定するプロパティ
+_COMPARED_PROPS = ("status", "totalGross", "totalDeduction", "otherPayment", "transferAmount")
+
+def _utc_iso() -> str:
+    """
+    Return the current UTC time as ISO 8601 with microseconds.
+
+    Same format as ``datetime.now(timezone.utc).isoformat()``
+    (``YYYY-MM-DDTHH:MM:SS.ffffff+00:00``) without building a datetime.
+    """
+    t = time.time()
+    return f"{time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(t))}.{int(t % 1 * 1e6):06d}+00:00"
 
 class TableRepository:
     def __init__(self, account_name: str, table_name: str):
         """
         Initialize the repository for Azure Table Storage.
 
-        This constructor prepares a Table client using DefaultAzureCredential and
-        ensures that the target table exists.
+        Only the settings are validated here. The Table client is prepared on
+        first use (see ``_table``), keeping credential setup and network calls
+        out of the Functions cold start.
 
         Args:
             account_name (str): Storage account name.
@@ -16,26 +36,35 @@ class TableRepository:
 
         Raises:
             ValueError: If `account_name` or `table_name` is empty.
-            azure.identity.CredentialUnavailableError: No usable credential in the
-                DefaultAzureCredential chain.
-            azure.core.exceptions.ClientAuthenticationError: Authentication failed.
-            azure.core.exceptions.HttpResponseError: Service returned 4xx/5xx during
-                table creation or access.
-            azure.core.exceptions.ServiceRequestError: Network or DNS failure.
 
         Notes:
             - Endpoint format: ``https://{account_name}.table.core.windows.net``.
-            - Uses DefaultAzureCredential (environment, managed identity, etc.).
-            - Creates the table if it does not exist.
         """
         if not account_name:
             raise ValueError("STORAGE_ACCOUNT_NAME is empty")
         if not table_name:
             raise ValueError("TABLE_NAME is empty")
-        endpoint = f"https://{account_name}.table.core.windows.net"
-        cred = DefaultAzureCredential()
-        service = TableServiceClient(endpoint=endpoint, credential=cred)
-        self._table = service.create_table_if_not_exists(table_name)
+        self._endpoint = f"https://{account_name}.table.core.windows.net"
+        self._table_name = table_name
+
+    @cached_property
+    def _table(self):
+        """
+        Table client, created on first access.
+
+        Uses the shared credential (managed identity on Azure) and
+        creates the table if it does not exist.
+
+        Raises:
+            azure.identity.CredentialUnavailableError: No usable credential
+                (e.g. managed identity is not enabled).
+            azure.core.exceptions.ClientAuthenticationError: Authentication failed.
+            azure.core.exceptions.HttpResponseError: Service returned 4xx/5xx during
+                table creation or access.
+            azure.core.exceptions.ServiceRequestError: Network or DNS failure.
+        """
+        service = TableServiceClient(endpoint=self._endpoint, credential=get_credential())
+        return service.create_table_if_not_exists(self._table_name)
 
     def upsert_payroll(
         self, *,
@@ -86,17 +115,130 @@ class TableRepository:
             - Upsert mode is ``merge``. To overwrite the whole entity, use ``replace``.
             - Timestamps are written in UTC ISO 8601 for auditing.
             - Integer coercion is applied to amount fields to avoid type drift.
+            - Sent as a one-entity :meth:`upsert_payroll_batch`.
+        """
+        self.upsert_payroll_batch([dict(
+            user_id=user_id,
+            year=year,
+            month=month,
+            pay_type=pay_type,
+            blob_path=blob_path,
+            filename=filename,
+            total_gross=total_gross,
+            total_deduction=total_deduction,
+            other_payment=other_payment,
+            transfer_amount=transfer_amount,
+            status=status,
+        )])
+
+    def upsert_payroll_batch(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """
+        Upsert many payroll records with Entity Group Transactions.
+
+        Rows are grouped by ``user_id`` (PartitionKey) and sent in transactions of
+        up to 100 MERGE upserts each, so a batch costs one request per user
+        instead of one per record.
+
+        Args:
+            rows (Iterable[Dict[str, Any]]): Records with the keyword arguments of
+                :meth:`upsert_payroll` as keys.
+
+        Returns:
+            None
+
+        Raises:
+            azure.data.tables.TableTransactionError: An operation in a transaction
+                failed; the whole transaction is rolled back.
+            azure.core.exceptions.HttpResponseError: Service returned 4xx/5xx.
+            azure.core.exceptions.ServiceRequestError: Network or DNS failure.
+            ValueError: Provided values cannot be serialized to Table entity types.
+
+        Notes:
+            - Transactions of earlier partitions stay committed if a later one fails.
+            - When the same entity appears more than once, the last row wins
+              (a transaction may not touch one entity twice).
+            - All rows of one call share the same ``ingestedAtUtc``.
+            - Rows whose status and amounts equal the stored entity are skipped
+              (one partition query per user), so replays of unchanged payslips
+              cost a read instead of a write and keep their original
+              ``ingestedAtUtc``.
+        """
+        # 取込時刻はバッチ単位で1回だけ求める
+        ingested_at = _utc_iso()
+        entities = {}
+        for row in rows:
+            entity = self._to_entity(ingested_at=ingested_at, **row)
+            entities[(entity["PartitionKey"], entity["RowKey"])] = entity
+        ordered = sorted(entities.values(), key=itemgetter("PartitionKey"))
+        for pk, group in itertools.groupby(ordered, key=itemgetter("PartitionKey")):
+            changed = self._drop_unchanged(pk, list(group))
+            for i in range(0, len(changed), _MAX_TRANSACTION_SIZE):
+                self._table.submit_transaction([
+                    (TransactionOperation.UPSERT, entity, {"mode": "merge"})
+                    for entity in changed[i:i + _MAX_TRANSACTION_SIZE]
+                ])
+
+    def _drop_unchanged(self, partition_key: str, entities: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Remove entities whose compared properties match what is already stored.
+
+        Args:
+            partition_key (str): PartitionKey shared by ``entities``.
+            entities (List[Dict[str, Any]]): Entities about to be upserted.
+
+        Returns:
+            List[Dict[str, Any]]: The entities that are new or changed.
+        """
+        stored = {
+            # Int64 の値は EntityProperty で返るため .value に揃える
+            e["RowKey"]: tuple(getattr(e.get(p), "value", e.get(p)) for p in _COMPARED_PROPS)
+            for e in self._table.query_entities(
+                "PartitionKey eq @pk",
+                parameters={"pk": partition_key},
+                select=["RowKey", *_COMPARED_PROPS],
+            )
+        }
+        return [
+            e for e in entities
+            if stored.get(e["RowKey"]) != tuple(e[p] for p in _COMPARED_PROPS)
+        ]
+
+    @staticmethod
+    def _to_entity(
+        *,
+        ingested_at: str,
+        user_id: str,
+        year: int,
+        month: int,
+        pay_type: str,
+        blob_path: str,
+        filename: str,
+        total_gross: int,
+        total_deduction: int,
+        other_payment: int,
+        transfer_amount: int,
+        status: str = "stub"
+    ) -> Dict[str, Any]:
+        """
+        Build the Table entity for one payroll record.
+
+        Args:
+            ingested_at (str): UTC ISO 8601 timestamp for ``ingestedAtUtc``.
+            Other arguments are those of :meth:`TableRepository.upsert_payroll`.
+
+        Returns:
+            Dict[str, Any]: Entity with PartitionKey = user_id and
+            RowKey = ``"{year:04d}-{month:02d}:{pay_type}"``.
         """
-        entity = {
+        return {
             "PartitionKey": user_id,
             "RowKey": f"{year:04d}-{month:02d}:{pay_type}",
             "sourceBlobPath": blob_path,
             "filename": filename,
-            "ingestedAtUtc": datetime.now(timezone.utc).isoformat(),
+            "ingestedAtUtc": ingested_at,
             "status": status,
             "totalGross": int(total_gross),
             "totalDeduction": int(total_deduction),
             "otherPayment": int(other_payment),
             "transferAmount": int(transfer_amount)
         }
-        self._table.upsert_entity(entity, mode="merge")